@@ -13,12 +13,12 @@ from __future__ import annotations
 
 import curses
 import fcntl
-import re
 import signal
 import struct
 import sys
 import termios
 from collections.abc import MutableSequence, Sequence
+from functools import lru_cache
 from gettext import gettext as _
 from textwrap import dedent
 
@@ -27,6 +27,12 @@ from .crpatch import Header, Hunk, HunkLine, PatchRoot
 
 _origstdout = sys.__stdout__  # used by gethw()
 
+# struct winsize as returned by TIOCGWINSZ, also used by gethw()
+_winsize = struct.Struct("hhhh")
+
+# maps control characters but tab to their ^[char] representation
+_controlchars = {c: '^' + chr(c + 64) for c in range(0x20) if c != 0x09}
+
 
 def gethw() -> tuple[int, int]:
     """
@@ -37,12 +43,49 @@ def gethw() -> tuple[int, int]:
     which can leave the terminal in a nasty state after exiting.
 
     """
-    h, w = struct.unpack(
-        "hhhh", fcntl.ioctl(_origstdout, termios.TIOCGWINSZ, b"\0" * 8),
+    h, w = _winsize.unpack(
+        fcntl.ioctl(_origstdout, termios.TIOCGWINSZ, b"\0" * _winsize.size),
     )[0:2]
     return h, w
 
 
+def displaystring(text: str) -> str:
+    """
+    Prepare the text to be printed: convert tabs to spaces, strip newlines
+    and convert control characters to ^[char] representation.
+
+    """
+    if text.isprintable():
+        # no tabs, newlines or control characters, nothing to do
+        return text
+    return text.expandtabs(4).strip('\n').translate(_controlchars)
+
+
+@lru_cache(maxsize=1024)
+def padding(column: int, width: int) -> str:
+    """Return the whitespace filling a line of the given width from column on."""
+    return " " * (width - column)
+
+
+def addattributes(colorpair: int, attrlist: Sequence[int]) -> int:
+    """Add the text attributes in attrlist to the color pair if possible."""
+    return _addattributes(colorpair, tuple(attrlist))
+
+
+@lru_cache(maxsize=None)
+def _addattributes(colorpair: int, attrs: tuple[int, ...]) -> int:
+    if colorpair < 256:
+        # then it is safe to apply all attributes
+        for textattr in attrs:
+            colorpair |= textattr
+    else:
+        # just apply a select few (safe?) attributes
+        for textattr in (curses.A_UNDERLINE, curses.A_BOLD):
+            if textattr in attrs:
+                colorpair |= textattr
+    return colorpair
+
+
 def chunkselector(opts, headerlist, ui):
     """
     Curses interface to get selection of chunks, and mark the applied flags
@@ -73,24 +116,59 @@ def chunkselector(opts, headerlist, ui):
     signal.signal(signal.SIGTSTP, f)
 
 
+def N_(message: str) -> str:
+    """Mark a message for translation, leaving it to be translated when displayed"""
+    return message
+
+
+# The messages below are translated when they are displayed, not when
+# the module is imported.
+
 header_messages = {
     # {operation: text}
-    'crecord': _('Select hunks to commit'),
-    'cstage': _('Select hunks to stage'),
-    'cunstage': _('Select hunks to keep'),
+    'crecord': N_('Select hunks to commit'),
+    'cstage': N_('Select hunks to stage'),
+    'cunstage': N_('Select hunks to keep'),
 }
 
 main_operation_messages = {
     # {operation: text}
-    'crecord': _('c: commit'),
-    'cstage': _('s: stage'),
+    'crecord': N_('c: commit'),
+    'cstage': N_('s: stage'),
     'cunstage': None,  # TODO: not implemented!
 }
 
+help_lines = """            [press any key to return to the patch-display]
+
+crecord allows you to interactively choose among the changes you have made,
+and confirm only those changes you select for further processing by the command
+you are running (commit/stage/unstage), after confirming the selected
+changes, the unselected changes are still present in your working copy, so you
+can use crecord multiple times to split large changes into smaller changesets.
+The following are valid keystrokes:
+
+                [SPACE] : (un-)select item ([~]/[X] = partly/fully applied)
+                      A : (un-)select all items
+    Up/Down-arrow [k/j] : go to previous/next unfolded item
+        PgUp/PgDn [K/J] : go to previous/next item of same type
+ Right/Left-arrow [l/h] : go to child item / parent item
+ Shift-Left-arrow   [H] : go to parent header / fold selected header
+                      g : go to the top
+                      G : go to the bottom
+                      f : fold / unfold item, hiding/revealing its children
+                      F : fold / unfold parent item and all of its ancestors
+                 ctrl-l : scroll the selected line to the top of the screen
+                      a : toggle amend mode
+                      c : commit selected changes
+                      s : stage selected changes
+                      r : review/edit and commit selected changes
+                      q : quit without committing (no changes will be made)
+                      ? : help (what you're currently reading)""".split("\n")
+
 confirm_messages = {
-    'crecord': _('Are you sure you want to commit the selected changes [Yn]?'),
-    'cstage': _('Are you sure you want to stage the selected changes [Yn]?'),
-    'cunstage': _('Are you sure you want to unstage the unselected changes [Yn]?'),
+    'crecord': N_('Are you sure you want to commit the selected changes [Yn]?'),
+    'cstage': N_('Are you sure you want to stage the selected changes [Yn]?'),
+    'cunstage': N_('Are you sure you want to unstage the unselected changes [Yn]?'),
 }
 
 
@@ -99,20 +177,36 @@ class CursesChunkSelector:
         # put the headers into a patch object
         self.headerlist = PatchRoot(headerlist)
 
+        # the text of headers and hunks doesn't change while they're
+        # displayed, so prepare it only once
+        self.headerlines = {}
+        self.headerfilenames = {}
+        self.fromtolines = {}
+        self.contextlines = {}
+        self.changedlines = {}
+        for h in headerlist:
+            self.headerlines[h] = h.prettystr().split("\n")
+            self.headerfilenames[h] = h.filename()
+            for hnk in h.hunks:
+                self.fromtolines[hnk] = hnk.getfromtoline().decode("UTF-8", errors="hexreplace").strip("\n")
+                self.contextlines[hnk] = (
+                    [line.decode("UTF-8", errors="hexreplace") for line in hnk.before],
+                    [line.decode("UTF-8", errors="hexreplace") for line in hnk.after],
+                )
+                for hunkline in hnk.changedlines:
+                    self.changedlines[hunkline] = hunkline.prettystr().strip("\n")
+
         self.ui = ui
 
         self.errorstr = None
-        # list of all chunks
-        self.chunklist = []
-        for h in headerlist:
-            self.chunklist.append(h)
-            self.chunklist.extend(h.hunks)
 
         # dictionary mapping (fgcolor, bgcolor) pairs to the
         # corresponding curses color-pair value.
         self.colorpairs = {}
         # maps custom nicknames of color-pairs to curses color-pair values
         self.colorpairnames = {}
+        # bold variants of the named color-pairs, used for headers and hunks
+        self.boldcolorpairnames = {}
 
         self.usecolor = True
         # the currently selected header, hunk, or hunk-line
@@ -127,6 +221,8 @@ class CursesChunkSelector:
         self.headerindentnumchars = 0
         self.hunkindentnumchars = 3
         self.hunklineindentnumchars = 6
+        self.hunkindent = " " * self.hunkindentnumchars
+        self.hunklineindent = " " * self.hunklineindentnumchars
 
         # the first line of the pad to print to the screen
         self.firstlineofpadtoprint = 0
@@ -134,8 +230,51 @@ class CursesChunkSelector:
         # keeps track of the number of lines in the pad
         self.numpadlines = None
 
+        # number of lines items take on the screen, as computed by
+        # getnumlinesdisplayed(), keyed by (id(item), ignorefolding,
+        # recursechildren); these only depend on the screen width and
+        # on which items are folded
+        self.linecounts = {}
+
+        # status prefix strings keyed by everything they depend on
+        self.statusprefixes = {}
+
+        # status bar lines keyed by the operation, whether the selected item
+        # is applied and the screen width, the only things they depend on
+        self.statuslines = {}
+
+        # the parts of the patch to display, see getdisplaylist()
+        self.displaylist = None
+
+        # the displayed items in order and their positions, see
+        # getadjacentitem(); rebuilt together with displaylist
+        self.navigationorder = None
+
+        # pad lines the displayed items start at, see getitemstartline();
+        # like linecounts, these only change with folding and resizing
+        self.itemstartlines = None
+
+        # items painted to the pad mapped to the pad line they start at,
+        # their start line as counted by printstring, the method which
+        # printed them and the state they were painted in, so that only
+        # the items whose state changes need to be painted again
+        self.painteditems = {}
+        # the item last painted as selected, and whether any items have been
+        # applied or unapplied since then; if not, only the selection can
+        # have moved
+        self.paintedselection = None
+        self.appliedchanged = False
+        # the pad line up to which items have been painted
+        self.paintedextent = 0
+        # whether the terminal has been resized since the screen was updated
+        self.windowresized = False
+
         self.numstatuslines = 1
 
+        # the column at which the next string starts when counting lines
+        # instead of printing them, see printstring()
+        self.countedcolumn = 0
+
         # keep a running count of the number of lines printed to the pad
         # (used for determining when the selected item begins/ends)
         self.linesprintedtopadsofar = 0
@@ -146,6 +285,33 @@ class CursesChunkSelector:
         # if the last 'toggle all' command caused all changes to be applied
         self.waslasttoggleallapplied = True
 
+        # keys handled by calling a method without arguments, see
+        # handlekeypressed() for the rest
+        self.keyhandlers = {
+            "k": self.uparrowevent,
+            "KEY_UP": self.uparrowevent,
+            "K": self.uparrowshiftevent,
+            "KEY_PPAGE": self.uparrowshiftevent,
+            "j": self.downarrowevent,
+            "KEY_DOWN": self.downarrowevent,
+            "J": self.downarrowshiftevent,
+            "KEY_NPAGE": self.downarrowshiftevent,
+            "l": self.rightarrowevent,
+            "KEY_RIGHT": self.rightarrowevent,
+            "h": self.leftarrowevent,
+            "KEY_LEFT": self.leftarrowevent,
+            "H": self.leftarrowshiftevent,
+            "KEY_SLEFT": self.leftarrowshiftevent,
+            "a": self.toggleamend,
+            " ": self.toggleapply,
+            "A": self.toggleall,
+            "f": self.togglefolded,
+            "g": self.handlefirstlineevent,
+            "KEY_HOME": self.handlefirstlineevent,
+            "G": self.handlelastlineevent,
+            "KEY_END": self.handlelastlineevent,
+        }
+
     def handlefirstlineevent(self):
         """Handle 'g' to navigate to the top most file in the ncurses window."""
         self.currentselecteditem = self.headerlist[0]
@@ -193,7 +359,7 @@ class CursesChunkSelector:
         """
         currentitem = self.currentselecteditem
 
-        nextitem = currentitem.previtem()
+        nextitem = self.getadjacentitem(currentitem, -1)
 
         if nextitem is None:
             # if no parent item (i.e. currentitem is the first header), then
@@ -232,7 +398,7 @@ class CursesChunkSelector:
         """
         currentitem = self.currentselecteditem
 
-        nextitem = currentitem.nextitem()
+        nextitem = self.getadjacentitem(currentitem, 1)
         # if there's no next item, keep the selection as-is
         if nextitem is None:
             nextitem = currentitem
@@ -348,11 +514,8 @@ class CursesChunkSelector:
 
     def scrolllines(self, numlines):
         """Scroll the screen up (down) by numlines when numlines >0 (<0)."""
-        self.firstlineofpadtoprint += numlines
-        if self.firstlineofpadtoprint < 0:
-            self.firstlineofpadtoprint = 0
-        if self.firstlineofpadtoprint > self.numpadlines - 1:
-            self.firstlineofpadtoprint = self.numpadlines - 1
+        firstline = max(self.firstlineofpadtoprint + numlines, 0)
+        self.firstlineofpadtoprint = min(firstline, self.numpadlines - 1)
 
     def toggleapply(self, item=None):
         """
@@ -364,6 +527,7 @@ class CursesChunkSelector:
             item = self.currentselecteditem
 
         item.applied = not item.applied
+        self.appliedchanged = True
 
         if isinstance(item, Header):
             item.partial = False
@@ -388,27 +552,12 @@ class CursesChunkSelector:
             for hunkline in item.changedlines:
                 hunkline.applied = item.applied
 
-            siblingappliedstatus = [hnk.applied for hnk in item.header.hunks]
-            allsiblingsapplied = all(siblingappliedstatus)
-            nosiblingsapplied = not any(siblingappliedstatus)
-
-            siblingspartialstatus = [hnk.partial for hnk in item.header.hunks]
-            somesiblingspartial = any(siblingspartialstatus)
-
-            # cases where applied or partial should be removed from header
-
-            # if no 'sibling' hunks are applied (including this hunk)
-            if nosiblingsapplied:
-                if not item.header.special():
-                    item.header.applied = False
-                    item.header.partial = False
-            else:  # some/all parent siblings are applied
-                item.header.applied = True
-                item.header.partial = somesiblingspartial or not allsiblingsapplied
+            self.updateheaderstatus(item.header)
         elif isinstance(item, HunkLine):
-            siblingappliedstatus = [ln.applied for ln in item.hunk.changedlines]
-            allsiblingsapplied = all(siblingappliedstatus)
-            nosiblingsapplied = not any(siblingappliedstatus)
+            # stop looking at the siblings as soon as the outcome is known
+            siblings = item.hunk.changedlines
+            allsiblingsapplied = all(ln.applied for ln in siblings)
+            nosiblingsapplied = not allsiblingsapplied and not any(ln.applied for ln in siblings)
 
             # if no 'sibling' lines are applied
             if nosiblingsapplied:
@@ -421,22 +570,23 @@ class CursesChunkSelector:
                 item.hunk.applied = True
                 item.hunk.partial = True
 
-            parentsiblingsapplied = [hnk.applied for hnk in item.hunk.header.hunks]
-            noparentsiblingsapplied = not any(parentsiblingsapplied)
-            allparentsiblingsapplied = all(parentsiblingsapplied)
-
-            parentsiblingspartial = [hnk.partial for hnk in item.hunk.header.hunks]
-            someparentsiblingspartial = any(parentsiblingspartial)
-
-            # if all parent hunks are not applied, un-apply header
-            if noparentsiblingsapplied:
-                if not item.hunk.header.special():
-                    item.hunk.header.applied = False
-                    item.hunk.header.partial = False
-            # set the applied and partial status of the header if needed
-            else:  # some/all parent siblings are applied
-                item.hunk.header.applied = True
-                item.hunk.header.partial = someparentsiblingspartial or not allparentsiblingsapplied
+            self.updateheaderstatus(item.hunk.header)
+
+    def updateheaderstatus(self, header):
+        """Update the applied and partial flags of the header from its hunks."""
+        hunks = header.hunks
+        # if no hunks are applied, un-apply the header
+        if not any(hnk.applied for hnk in hunks):
+            if not header.special():
+                header.applied = False
+                header.partial = False
+        # set the applied and partial status of the header if needed
+        else:  # some/all hunks are applied
+            header.applied = True
+            header.partial = (
+                not all(hnk.applied for hnk in hunks)
+                or any(hnk.partial for hnk in hunks)
+            )
 
     def toggleall(self):
         """Toggle the applied flag of all items."""
@@ -469,21 +619,60 @@ class CursesChunkSelector:
         if isinstance(item, (Header, Hunk)):
             item.folded = not item.folded
 
-    def alignstring(self, instr, window):
+        self.linecounts.clear()
+        self.displaylist = None
+        self.navigationorder = None
+        self.itemstartlines = None
+        self.painteditems = {}
+
+    def alignstring(self, instr, window=None):
         """
         Add whitespace to the end of a string in order to make it fill
         the screen in the x direction.  The current cursor position is
         taken into account when making this calculation.  The string can span
         multiple lines.
 
+        If no window is given, the string is assumed to start at the
+        beginning of a line.
+
+        Tabs are expected to have been expanded already by displaystring().
+
         """
-        y, xstart = window.getyx()
+        if window is not None:
+            y, xstart = window.getyx()
+        else:
+            xstart = 0
         width = self.xscreensize
-        # turn tabs into spaces
-        instr = instr.expandtabs(4)
         strwidth = encoding.ucolwidth(instr)
-        numspaces = width - ((strwidth + xstart) % width)
-        return instr + " " * numspaces
+        return instr + padding((strwidth + xstart) % width, width)
+
+    def alignlines(self, lines):
+        """
+        Join the lines into a single string, each of them padded with
+        whitespace to fill the screen in the x direction.
+
+        """
+        return "".join(self.alignstring(displaystring(line)) for line in lines)
+
+    def printlineprefix(self, prefix, towin=True):
+        """
+        Print the uncolored indent and checkbox in front of a hunk line.
+
+        The prefix is plain ASCII without any trailing whitespace to show, so
+        it is sent to the pad directly instead of going through printstring.
+
+        Return the number of lines printed.
+        """
+        if towin:
+            colorpair = self.colorpairs.get((-1, -1))
+            if colorpair is None:
+                colorpair = self.getcolorpair()
+            self.chunkpad.addstr(prefix, colorpair)
+        strwidth = self.countedcolumn + len(prefix)
+        linesprinted = strwidth // self.xscreensize
+        self.countedcolumn = strwidth % self.xscreensize
+        self.linesprintedtopadsofar += linesprinted
+        return linesprinted
 
     def printstring(
         self,
@@ -516,84 +705,99 @@ class CursesChunkSelector:
 
         If showwhtspc == True, trailing whitespace of a string is highlighted.
 
-        """
-        # preprocess the text, converting tabs to spaces
-        text = text.expandtabs(4)
-        # Strip \n, and convert control characters to ^[char] representation
-        text = re.sub(
-            r'[\x00-\x08\x0a-\x1f]',
-            lambda m: '^' + chr(ord(m.group()) + 64), text.strip('\n'),
-        )
+        If towin == False, nothing is printed, but the lines are counted
+        as if the string was printed.
+
+        Return the number of lines printed.
 
-        if pair is not None:
-            colorpair = pair
-        elif pairname is not None:
-            colorpair = self.colorpairnames[pairname]
+        """
+        text = displaystring(text)
+        xscreensize = self.xscreensize
+
+        if not towin:
+            # only count the lines: no color pair is needed, and trailing
+            # whitespace takes up as many columns whether it's shown or not
+            xstart = self.countedcolumn
+            numtrailingspaces = 0
         else:
-            if fgcolor is None:
-                fgcolor = -1
-            if bgcolor is None:
-                bgcolor = -1
-            if (fgcolor, bgcolor) in self.colorpairs:
-                colorpair = self.colorpairs[(fgcolor, bgcolor)]
+            if pair is not None:
+                colorpair = pair
+            elif pairname is not None:
+                colorpair = self.colorpairnames[pairname]
             else:
-                colorpair = self.getcolorpair(fgcolor, bgcolor)
-        # add attributes if possible
-        if attrlist is None:
-            attrlist = []
-        if colorpair < 256:
-            # then it is safe to apply all attributes
-            for textattr in attrlist:
-                colorpair |= textattr
-        else:
-            # just apply a select few (safe?) attributes
-            for textattr in (curses.A_UNDERLINE, curses.A_BOLD):
-                if textattr in attrlist:
-                    colorpair |= textattr
-
-        y, xstart = self.chunkpad.getyx()
-        t = ""  # variable for counting lines printed
-        # if requested, show trailing whitespace
-        if showwhtspc:
-            origlen = len(text)
-            text = text.rstrip(' \n')  # tabs have already been expanded
-            strippedlen = len(text)
-            numtrailingspaces = origlen - strippedlen
-
-        if towin:
-            window.addstr(text, colorpair)
-        t += text
-
-        if showwhtspc:
-            wscolorpair = colorpair | curses.A_REVERSE
-            if towin:
-                for i in range(numtrailingspaces):
-                    window.addch(curses.ACS_CKBOARD, wscolorpair)
-            t += " " * numtrailingspaces
-
-        if align:
-            if towin:
-                extrawhitespace = self.alignstring("", window)
-                window.addstr(extrawhitespace, colorpair)
+                if fgcolor is None:
+                    fgcolor = -1
+                if bgcolor is None:
+                    bgcolor = -1
+                colorpair = self.colorpairs.get((fgcolor, bgcolor))
+                if colorpair is None:
+                    colorpair = self.getcolorpair(fgcolor, bgcolor)
+            if attrlist:
+                colorpair = addattributes(colorpair, attrlist)
+
+            y, xstart = window.getyx()
+            # if requested, show trailing whitespace
+            numtrailingspaces = 0
+            if showwhtspc:
+                origlen = len(text)
+                text = text.rstrip(' \n')  # tabs have already been expanded
+                strippedlen = len(text)
+                numtrailingspaces = origlen - strippedlen
+
+            if align and not numtrailingspaces and text.isascii():
+                # the padding can be worked out without asking the window where
+                # the text ended, so send the text and the padding in one go
+                window.addstr(
+                    text + padding((xstart + len(text)) % xscreensize, xscreensize), colorpair,
+                )
             else:
-                # need to use t, since the x position hasn't incremented
-                extrawhitespace = self.alignstring(t, window)
-            t += extrawhitespace
+                window.addstr(text, colorpair)
+
+                if numtrailingspaces:
+                    wscolorpair = colorpair | curses.A_REVERSE
+                    y, x = window.getyx()
+                    maxx = window.getmaxyx()[1]
+                    # draw the whitespace with one call per screen line it
+                    # takes up, wrapping like addch() would
+                    remaining = numtrailingspaces
+                    while remaining:
+                        n = min(remaining, maxx - x)
+                        window.hline(curses.ACS_CKBOARD | wscolorpair, n)
+                        remaining -= n
+                        x += n
+                        if x == maxx:
+                            y, x = y + 1, 0
+                        window.move(y, x)
+
+                if align:
+                    extrawhitespace = self.alignstring("", window)
+                    window.addstr(extrawhitespace, colorpair)
+
+        # count the lines from the width of the text instead of building
+        # the padded string
+        strwidth = encoding.ucolend(text, xstart, xscreensize) + numtrailingspaces
+        linesprinted = strwidth // xscreensize
+        if align:
+            # the rest of the last line is filled with whitespace
+            linesprinted += 1
+            self.countedcolumn = 0
+        else:
+            self.countedcolumn = strwidth % xscreensize
 
         # is reset to 0 at the beginning of printitem()
-
-        linesprinted = (xstart + len(t)) // self.xscreensize
         self.linesprintedtopadsofar += linesprinted
-        return t
+        return linesprinted
 
     def _getstatuslinesegments(self):
         """-> [str]. return segments"""
         selected = self.currentselecteditem.applied
+        operation = self.opts['operation']
+        mainoperation = main_operation_messages[operation]
         segments = [
-            header_messages[self.opts['operation']],
+            _(header_messages[operation]),
             '-',
             _('[x]=selected **=collapsed'),
-            main_operation_messages[self.opts['operation']],
+            mainoperation and _(mainoperation),
             _('q: abort'),
             _('arrow keys: move/expand/collapse'),
             _('space: deselect') if selected else _('space: select'),
@@ -606,28 +810,35 @@ class CursesChunkSelector:
         if self.errorstr is not None:
             lines = [self.errorstr, _('Press any key to continue')]
         else:
-            # wrap segments to lines
-            segments = self._getstatuslinesegments()
-            width = self.xscreensize
-            lines = []
-            lastwidth = width
-            for s in segments:
-                w = encoding.ucolwidth(s)
-                sep = ' ' * (1 + (s and s[0] not in '-['))
-                if lastwidth + w + len(sep) >= width:
-                    lines.append(s)
-                    lastwidth = w
-                else:
-                    lines[-1] += sep + s
-                    lastwidth += w + len(sep)
+            key = (self.opts['operation'], self.currentselecteditem.applied, self.xscreensize)
+            lines = self.statuslines.get(key)
+            if lines is None:
+                # wrap segments to lines
+                segments = self._getstatuslinesegments()
+                width = self.xscreensize
+                lines = []
+                lastwidth = width
+                for s in segments:
+                    w = encoding.ucolwidth(s)
+                    sep = ' ' * (1 + (s and s[0] not in '-['))
+                    if lastwidth + w + len(sep) >= width:
+                        lines.append(s)
+                        lastwidth = w
+                    else:
+                        lines[-1] += sep + s
+                        lastwidth += w + len(sep)
+                self.statuslines[key] = lines
         if len(lines) != self.numstatuslines:
             self.numstatuslines = len(lines)
             self.statuswin.resize(self.numstatuslines, self.xscreensize)
         return [util.ellipsis(line, self.xscreensize - 1) for line in lines]
 
     def updatescreen(self):
+        if self.windowresized:
+            self.windowresized = False
+            self.resizewindows()
+
         self.statuswin.erase()
-        self.chunkpad.erase()
 
         printstring = self.printstring
 
@@ -635,17 +846,21 @@ class CursesChunkSelector:
         try:
             for line in self._getstatuslines():
                 printstring(self.statuswin, line, pairname="legend")
-            self.statuswin.refresh()
+            # both windows are sent to the terminal together by doupdate()
+            self.statuswin.noutrefresh()
         except curses.error:
             pass
         if self.errorstr is not None:
+            curses.doupdate()
             return
 
         # print out the patch in the remaining part of the window
         try:
-            self.printitem()
-            self.updatescroll()
-            self.chunkpad.refresh(
+            if not self.repaintchangeditems():
+                self.paintpad()
+            # other windows may have been drawn over the pad
+            self.chunkpad.touchwin()
+            self.chunkpad.noutrefresh(
                 self.firstlineofpadtoprint, 0,
                 self.numstatuslines, 0,
                 self.yscreensize - self.numstatuslines,
@@ -653,6 +868,84 @@ class CursesChunkSelector:
             )
         except curses.error:
             pass
+        curses.doupdate()
+
+    def paintpad(self):
+        """Paint the patch to the pad from scratch and scroll to the selection."""
+        self.chunkpad.erase()
+        self.painteditems = {}
+        self.paintedextent = 0
+        self.appliedchanged = False
+        self.printitem()
+        if self.outofdisplayedarea():
+            self.paintedextent = self.chunkpad.getyx()[0]
+        else:
+            self.paintedextent = self.numpadlines
+        self.updatescroll()
+
+    def repaintchangeditems(self):
+        """
+        Repaint the items whose state has changed since they were painted,
+        and scroll to the selection.
+
+        Return False if the pad needs to be painted from scratch instead,
+        since the layout has changed or the visible part of the pad has not
+        been painted yet.
+
+        """
+        currentitem = self.currentselecteditem
+        if currentitem not in self.painteditems:
+            return False
+
+        if self.appliedchanged:
+            items = self.painteditems
+            self.appliedchanged = False
+        else:
+            items = [
+                item for item in (self.paintedselection, currentitem)
+                if item in self.painteditems
+            ]
+
+        for item in items:
+            y, startline, printer, state = self.painteditems[item]
+            selected = item is currentitem
+            newstate = self.getitemstate(item, selected)
+            if newstate == state:
+                continue
+            self.chunkpad.move(y, 0)
+            printer(item, selected)
+            self.painteditems[item] = (y, startline, printer, newstate)
+        self.paintedselection = currentitem
+
+        y, startline, printer, state = self.painteditems[currentitem]
+        self.selecteditemstartline = startline
+        selecteditemlines = self.getnumlinesdisplayed(currentitem, recursechildren=False)
+        self.selecteditemendline = startline + selecteditemlines - 1
+        firstlineofpadtoprint = self.firstlineofpadtoprint
+        self.updatescroll()
+
+        visibleend = self.firstlineofpadtoprint + self.yscreensize - self.numstatuslines
+        if visibleend > self.paintedextent:
+            # paintpad() scrolls to the selection again, which doesn't
+            # always end up in the same place when starting from the new
+            # position, so let it start from the old one
+            self.firstlineofpadtoprint = firstlineofpadtoprint
+            return False
+        return True
+
+    def getitemstate(self, item, selected):
+        """Return the state which determines how the item is displayed."""
+        return item.applied, getattr(item, 'partial', False), selected
+
+    def rememberitem(self, item, printer, selected):
+        """Remember where, how and in which state the item is painted to the pad."""
+        y = self.chunkpad.getyx()[0]
+        if selected:
+            self.paintedselection = item
+        self.painteditems[item] = (
+            y, self.linesprintedtopadsofar, printer,
+            self.getitemstate(item, selected),
+        )
 
     def getstatusprefixstring(self, item):
         """
@@ -660,6 +953,15 @@ class CursesChunkSelector:
         is applied and/or folded.
 
         """
+        folded = item.folded
+        key = (
+            item.__class__, item.applied, getattr(item, 'partial', False),
+            folded, folded and isinstance(item, Header) and item.changetype,
+        )
+        checkbox = self.statusprefixes.get(key)
+        if checkbox is not None:
+            return checkbox
+
         # create checkbox string
         if item.applied:
             if not isinstance(item, HunkLine) and item.partial:
@@ -669,45 +971,41 @@ class CursesChunkSelector:
         else:
             checkbox = "[ ]"
 
-        try:
-            if item.folded:
-                checkbox += "**"
-                if isinstance(item, Header):
-                    # one of "M", "A", or "D" (modified, added, deleted)
-                    filestatus = item.changetype
+        if folded:
+            checkbox += "**"
+            if isinstance(item, Header):
+                # one of "M", "A", or "D" (modified, added, deleted)
+                filestatus = item.changetype
 
-                    checkbox += filestatus + " "
-            else:
-                checkbox += "  "
-                if isinstance(item, Header):
-                    # add two more spaces for headers
-                    checkbox += "  "
-        except AttributeError:  # not foldable
+                checkbox += filestatus + " "
+        else:
             checkbox += "  "
+            if isinstance(item, Header):
+                # add two more spaces for headers
+                checkbox += "  "
 
+        self.statusprefixes[key] = checkbox
         return checkbox
 
     def printheader(
         self, header: Header, selected=False, towin=True, ignorefolding=False,
     ):
         """
-        Print the header to the pad.  If countLines is True, don't print
+        Print the header to the pad.  If towin is False, don't print
         anything, but just count the number of lines which would be printed.
 
+        Return the number of lines.
+
         """
-        outstr = ""
-        text = header.prettystr()
-        chunkindex = self.chunklist.index(header)
+        numlines = 0
 
-        if chunkindex != 0 and not header.folded:
+        if header is not self.headerlist[0] and not header.folded:
             # add separating line before headers
-            outstr += self.printstring(
-                self.chunkpad, "_" * self.xscreensize, towin=towin, align=False,
+            numlines += self.printstring(
+                self.chunkpad, self.headerseparator, towin=towin, align=False,
             )
         # select color-pair based on if the header is selected
-        colorpair = self.getcolorpair(
-            name=selected and "selected" or "normal", attrlist=[curses.A_BOLD],
-        )
+        colorpair = self.boldcolorpairnames[selected and "selected" or "normal"]
 
         # print out each line of the chunk, expanding it to screen width
 
@@ -715,98 +1013,97 @@ class CursesChunkSelector:
         indentnumchars = 0
         checkbox = self.getstatusprefixstring(header)
         if not header.folded or ignorefolding:
-            textlist = text.split("\n")
+            textlist = self.headerlines[header]
             linestr = checkbox + textlist[0]
         else:
-            linestr = checkbox + header.filename()
-        outstr += self.printstring(self.chunkpad, linestr, pair=colorpair, towin=towin)
+            linestr = checkbox + self.headerfilenames[header]
+        numlines += self.printstring(self.chunkpad, linestr, pair=colorpair, towin=towin)
         if not header.folded or ignorefolding:
             if len(textlist) > 1:
-                for line in textlist[1:]:
-                    linestr = " " * (indentnumchars + len(checkbox)) + line
-                    outstr += self.printstring(
-                        self.chunkpad, linestr, pair=colorpair, towin=towin,
-                    )
+                # pad each of the remaining lines to the screen width and
+                # send them to the pad in one go
+                indent = " " * (indentnumchars + len(checkbox))
+                block = self.alignlines(indent + line for line in textlist[1:])
+                numlines += self.printstring(
+                    self.chunkpad, block, pair=colorpair, towin=towin, align=False,
+                )
 
-        return outstr
+        return numlines
 
     def printhunklinesbefore(
         self, hunk: Hunk, selected=False, towin=True, ignorefolding=False,
     ):
         """Print lines including the start/end line indicator."""
-        outstr = ""
-        # where hunk is in list of siblings
-        hunkindex = hunk.header.hunks.index(hunk)
+        numlines = 0
 
-        if hunkindex != 0:
+        if hunk is not hunk.header.hunks[0]:
             # add separating line before headers
-            outstr += self.printstring(
-                self.chunkpad, " " * self.xscreensize, towin=towin, align=False,
+            numlines += self.printstring(
+                self.chunkpad, self.hunkseparator, towin=towin, align=False,
             )
 
-        colorpair = self.getcolorpair(
-            name=selected and "selected" or "normal", attrlist=[curses.A_BOLD],
-        )
+        colorpair = self.boldcolorpairnames[selected and "selected" or "normal"]
 
         # print out from-to line with checkbox
         checkbox = self.getstatusprefixstring(hunk)
 
-        lineprefix = " " * self.hunkindentnumchars + checkbox
-        frtoline = "   " + hunk.getfromtoline().decode("UTF-8", errors="hexreplace").strip("\n")
+        lineprefix = self.hunkindent + checkbox
+        frtoline = "   " + self.fromtolines[hunk]
 
-        outstr += self.printstring(
-            self.chunkpad, lineprefix, towin=towin, align=False,
-        )  # add uncolored checkbox/indent
-        outstr += self.printstring(self.chunkpad, frtoline, pair=colorpair, towin=towin)
+        numlines += self.printlineprefix(lineprefix, towin=towin)  # add uncolored checkbox/indent
+        numlines += self.printstring(self.chunkpad, frtoline, pair=colorpair, towin=towin)
 
         if hunk.folded and not ignorefolding:
             # skip remainder of output
-            return outstr
+            return numlines
 
         # print out lines of the chunk preceding changed-lines
-        for line in hunk.before:
-            linestr = " " * (self.hunklineindentnumchars + len(checkbox)) + line.decode("UTF-8", errors="hexreplace")
-            outstr += self.printstring(self.chunkpad, linestr, towin=towin)
+        indent = self.hunklineindent + " " * len(checkbox)
+        for line in self.contextlines[hunk][0]:
+            numlines += self.printstring(self.chunkpad, indent + line, towin=towin)
 
-        return outstr
+        return numlines
 
-    def printhunklinesafter(self, hunk: Hunk, towin=True, ignorefolding=False):
-        outstr = ""
+    def printhunklinesafter(
+        self, hunk: Hunk, selected=False, towin=True, ignorefolding=False,
+    ):
+        numlines = 0
         if hunk.folded and not ignorefolding:
-            return outstr
+            return numlines
 
         # a bit superfluous, but to avoid hard-coding indent amount
         checkbox = self.getstatusprefixstring(hunk)
-        for line in hunk.after:
-            linestr = " " * (self.hunklineindentnumchars + len(checkbox)) + line.decode("UTF-8", errors="hexreplace")
-            outstr += self.printstring(self.chunkpad, linestr, towin=towin)
+        indent = self.hunklineindent + " " * len(checkbox)
+        for line in self.contextlines[hunk][1]:
+            numlines += self.printstring(self.chunkpad, indent + line, towin=towin)
 
-        return outstr
+        return numlines
 
-    def printhunkchangedline(self, hunkline: HunkLine, selected=False, towin=True):
-        outstr = ""
+    def printhunkchangedline(
+        self, hunkline: HunkLine, selected=False, towin=True, ignorefolding=False,
+    ):
+        numlines = 0
         checkbox = self.getstatusprefixstring(hunkline)
 
-        linestr = hunkline.prettystr().strip("\n")
+        linestr = self.changedlines[hunkline]
 
         # select color-pair based on whether line is an addition/removal
+        colorpairnames = self.colorpairnames
         if selected:
-            colorpair = self.getcolorpair(name="selected")
+            colorpair = colorpairnames["selected"]
         elif linestr.startswith("+"):
-            colorpair = self.getcolorpair(name="addition")
+            colorpair = colorpairnames["addition"]
         elif linestr.startswith("-"):
-            colorpair = self.getcolorpair(name="deletion")
+            colorpair = colorpairnames["deletion"]
         elif linestr.startswith("\\"):
-            colorpair = self.getcolorpair(name="normal")
+            colorpair = colorpairnames["normal"]
 
-        lineprefix = " " * self.hunklineindentnumchars + checkbox
-        outstr += self.printstring(
-            self.chunkpad, lineprefix, towin=towin, align=False,
-        )  # add uncolored checkbox/indent
-        outstr += self.printstring(
+        lineprefix = self.hunklineindent + checkbox
+        numlines += self.printlineprefix(lineprefix, towin=towin)  # add uncolored checkbox/indent
+        numlines += self.printstring(
             self.chunkpad, linestr, pair=colorpair, towin=towin, showwhtspc=True,
         )
-        return outstr
+        return numlines
 
     def printitem(
         self, item=None, ignorefolding=False, recursechildren=True, towin=True,
@@ -814,18 +1111,32 @@ class CursesChunkSelector:
         """Print the specified item.
 
         If item is not specified, then print the entire patch.
-        (hiding folded elements, etc. -- see __printitem() docstring)
+        (hiding folded elements, etc. -- see __flattenitem() docstring)
+
+        Return the number of lines printed.
         """
         if item is None:
             item = self.headerlist
         if recursechildren:
             self.linesprintedtopadsofar = 0
-
-        outstr = []
-        self.__printitem(
-            item, ignorefolding, recursechildren, outstr, towin=towin,
-        )
-        return ''.join(outstr)
+        self.countedcolumn = 0
+
+        numlines = 0
+        displaylist = self.getdisplaylist(item, ignorefolding, recursechildren)
+        # look the methods up once, this loop runs for every line of the patch
+        outofdisplayedarea = self.outofdisplayedarea
+        handleselection = self.handleselection
+        rememberitem = self.rememberitem
+        for part, printer, partisstart in displaylist:
+            if towin and outofdisplayedarea():
+                break
+            selected = partisstart and handleselection(part, recursechildren)
+            if towin and partisstart:
+                rememberitem(part, printer, selected)
+            numlines += printer(
+                part, selected, towin=towin, ignorefolding=ignorefolding,
+            )
+        return numlines
 
     def outofdisplayedarea(self):
         y, _ = self.chunkpad.getyx()  # cursor location
@@ -846,66 +1157,62 @@ class CursesChunkSelector:
 
         return selected
 
-    def __printitem(
+    def getdisplaylist(self, item, ignorefolding, recursechildren):
+        """
+        Return the parts of the item to print, in order.
+
+        The list for the entire patch with folded items hidden is only
+        rebuilt when folding changes.
+        """
+        if item is self.headerlist and recursechildren and not ignorefolding:
+            if self.displaylist is None:
+                self.displaylist = self.__flattenitem(item, False, True, [])
+            return self.displaylist
+        return self.__flattenitem(item, ignorefolding, recursechildren, [])
+
+    def __flattenitem(
         self,
         item: PatchRoot | Header | Hunk | HunkLine,
         ignorefolding: bool,
         recursechildren: bool,
-        outstr: MutableSequence[str],
-        towin: bool = True,
+        displaylist: MutableSequence[tuple],
     ):
         """
-        Recursive method for printing out patch/header/hunk/hunk-line data to
-        screen.  Also returns a string with all of the content of the displayed
-        patch (not including coloring, etc.).
+        Recursive method for collecting the parts of patch/header/hunk/hunk-line
+        data to be printed out to screen.  Each part is a tuple of the item,
+        the method printing it, and whether the part is the start of the item
+        (as opposed to the context lines following a hunk).
 
-        If ignorefolding is True, then folded items are printed out.
+        If ignorefolding is True, then folded items are included.
 
-        If recursechildren is False, then only print the item without its
+        If recursechildren is False, then only include the item without its
         child items.
 
         """
-        if towin and self.outofdisplayedarea():
-            return
-
-        selected = self.handleselection(item, recursechildren)
-
         # Patch object is a list of headers
         if isinstance(item, PatchRoot):
             if recursechildren:
                 for hdr in item:
-                    self.__printitem(hdr, ignorefolding, recursechildren, outstr, towin)
+                    self.__flattenitem(hdr, ignorefolding, recursechildren, displaylist)
         # TODO: eliminate all isinstance() calls
         if isinstance(item, Header):
-            outstr.append(
-                self.printheader(
-                    item, selected, towin=towin, ignorefolding=ignorefolding,
-                ),
-            )
+            displaylist.append((item, self.printheader, True))
             if recursechildren:
                 for hnk in item.hunks:
-                    self.__printitem(hnk, ignorefolding, recursechildren, outstr, towin)
+                    self.__flattenitem(hnk, ignorefolding, recursechildren, displaylist)
         elif isinstance(item, Hunk) and ((not item.header.folded) or ignorefolding):
-            # print the hunk data which comes before the changed-lines
-            outstr.append(
-                self.printhunklinesbefore(
-                    item, selected, towin=towin, ignorefolding=ignorefolding,
-                ),
-            )
+            # the hunk data which comes before the changed-lines
+            displaylist.append((item, self.printhunklinesbefore, True))
             if recursechildren:
                 for line in item.changedlines:
-                    self.__printitem(
-                        line, ignorefolding, recursechildren, outstr, towin,
+                    self.__flattenitem(
+                        line, ignorefolding, recursechildren, displaylist,
                     )
-                outstr.append(
-                    self.printhunklinesafter(
-                        item, towin=towin, ignorefolding=ignorefolding,
-                    ),
-                )
+                displaylist.append((item, self.printhunklinesafter, False))
         elif isinstance(item, HunkLine) and ((not item.hunk.folded) or ignorefolding):
-            outstr.append(self.printhunkchangedline(item, selected, towin=towin))
+            displaylist.append((item, self.printhunkchangedline, True))
 
-        return outstr
+        return displaylist
 
     def getnumlinesdisplayed(
         self, item=None, ignorefolding=False, recursechildren=True,
@@ -919,19 +1226,86 @@ class CursesChunkSelector:
         the number of lines.
 
         """
-        # temporarily disable printing to windows by printstring
-        patchdisplaystring = self.printitem(
-            item, ignorefolding, recursechildren, towin=False,
-        )
-        numlines = len(patchdisplaystring) // self.xscreensize
-        return numlines
+        if item is None:
+            item = self.headerlist
+        key = (id(item), ignorefolding, recursechildren)
+        if key not in self.linecounts:
+            # this may be called while printing, so keep the count of lines
+            # printed so far intact
+            linesprinted = self.linesprintedtopadsofar
+            # temporarily disable printing to windows by printstring
+            self.linecounts[key] = self.printitem(
+                item, ignorefolding, recursechildren, towin=False,
+            )
+            self.linesprintedtopadsofar = linesprinted
+        return self.linecounts[key]
+
+    def getadjacentitem(self, item, step):
+        """
+        Return the displayed item step items after (or before, if step is
+        negative) the given one, or None if there is no such item.
+
+        The displayed items are numbered once until folding changes, so moving
+        up and down doesn't have to search the patch for siblings.
+        """
+        if self.navigationorder is None:
+            items = [
+                part for part, printer, partisstart in self.getdisplaylist(self.headerlist, False, True)
+                if partisstart
+            ]
+            self.navigationorder = (items, {id(part): i for i, part in enumerate(items)})
+        items, positions = self.navigationorder
+        index = positions.get(id(item))
+        if index is None:
+            # the item is hidden by folding, so walk the patch from it instead
+            return item.nextitem() if step > 0 else item.previtem()
+        index += step
+        if 0 <= index < len(items):
+            return items[index]
+        return None
+
+    def getitemstartline(self, item):
+        """
+        Return the pad line the item starts at when the entire patch is
+        displayed, or None if the item is hidden by folding.
+
+        The whole patch is only measured once until folding changes or the
+        screen is resized, so moving around doesn't need to count it again.
+        """
+        if self.itemstartlines is None:
+            self.itemstartlines = {}
+            linesprinted = self.linesprintedtopadsofar
+            self.linesprintedtopadsofar = 0
+            for part, printer, partisstart in self.getdisplaylist(self.headerlist, False, True):
+                if partisstart:
+                    self.itemstartlines[id(part)] = self.linesprintedtopadsofar
+                # every part starts at the beginning of a line
+                self.countedcolumn = 0
+                printer(part, towin=False)
+            self.linesprintedtopadsofar = linesprinted
+        return self.itemstartlines.get(id(item))
 
     def sigwinchhandler(self, n, frame):
-        """Handle window resizing"""
+        """Handle window resizing
+
+        The signal can arrive in the middle of painting the pad, so only
+        take note of it here and resize the windows before the screen is
+        updated next.
+
+        """
+        self.windowresized = True
+
+    def resizewindows(self):
+        """Resize the windows to the new screen size"""
         try:
             curses.endwin()
             self.yscreensize, self.xscreensize = gethw()
+            self.headerseparator = "_" * self.xscreensize
+            self.hunkseparator = " " * self.xscreensize
             self.statuswin.resize(self.numstatuslines, self.xscreensize)
+            self.linecounts.clear()
+            self.itemstartlines = None
+            self.painteditems = {}
             self.numpadlines = self.getnumlinesdisplayed(ignorefolding=True) + 1
             self.chunkpad = curses.newpad(self.numpadlines, self.xscreensize)
 
@@ -954,17 +1328,15 @@ class CursesChunkSelector:
         curses.A_BOLD.
 
         """
-        if (name is not None) and name in self.colorpairnames:
-            # then get the associated color pair and return it
-            colorpair = self.colorpairnames[name]
-        else:
+        # get the associated color pair if there is one
+        colorpair = self.colorpairnames.get(name) if name is not None else None
+        if colorpair is None:
             if fgcolor is None:
                 fgcolor = -1
             if bgcolor is None:
                 bgcolor = -1
-            if (fgcolor, bgcolor) in self.colorpairs:
-                colorpair = self.colorpairs[(fgcolor, bgcolor)]
-            else:
+            colorpair = self.colorpairs.get((fgcolor, bgcolor))
+            if colorpair is None:
                 pairindex = len(self.colorpairs) + 1
                 if self.usecolor:
                     curses.init_pair(pairindex, fgcolor, bgcolor)
@@ -981,58 +1353,21 @@ class CursesChunkSelector:
                         self.colorpairnames[name] = cval
                     colorpair = self.colorpairs[(fgcolor, bgcolor)] = cval
 
-        # add attributes if possible
-        if attrlist is None:
-            attrlist = []
-        if colorpair < 256:
-            # then it is safe to apply all attributes
-            for textattr in attrlist:
-                colorpair |= textattr
-        else:
-            # just apply a select few (safe?) attributes
-            for textattrib in (curses.A_UNDERLINE, curses.A_BOLD):
-                if textattrib in attrlist:
-                    colorpair |= textattrib
+        if attrlist:
+            colorpair = addattributes(colorpair, attrlist)
         return colorpair
 
     def helpwindow(self):
         """Print a help window to the screen.  Exit after any keypress."""
-        helptext = """            [press any key to return to the patch-display]
-
-crecord allows you to interactively choose among the changes you have made,
-and confirm only those changes you select for further processing by the command
-you are running (commit/stage/unstage), after confirming the selected
-changes, the unselected changes are still present in your working copy, so you
-can use crecord multiple times to split large changes into smaller changesets.
-The following are valid keystrokes:
-
-                [SPACE] : (un-)select item ([~]/[X] = partly/fully applied)
-                      A : (un-)select all items
-    Up/Down-arrow [k/j] : go to previous/next unfolded item
-        PgUp/PgDn [K/J] : go to previous/next item of same type
- Right/Left-arrow [l/h] : go to child item / parent item
- Shift-Left-arrow   [H] : go to parent header / fold selected header
-                      g : go to the top
-                      G : go to the bottom
-                      f : fold / unfold item, hiding/revealing its children
-                      F : fold / unfold parent item and all of its ancestors
-                 ctrl-l : scroll the selected line to the top of the screen
-                      a : toggle amend mode
-                      c : commit selected changes
-                      s : stage selected changes
-                      r : review/edit and commit selected changes
-                      q : quit without committing (no changes will be made)
-                      ? : help (what you're currently reading)"""
-
         helpwin = curses.newwin(self.yscreensize, 0, 0, 0)
-        helplines = helptext.split("\n")
-        helplines = helplines + [" "] * (
-            self.yscreensize - self.numstatuslines - len(helplines) - 1
-        )
         try:
-            self.printstring(helpwin, helplines[0], pairname="legend")
-            for line in helplines[1:]:
-                self.printstring(helpwin, line, pairname="normal")
+            self.printstring(helpwin, help_lines[0], pairname="legend")
+            # pad the lines to the window width and send them in one go
+            self.printstring(
+                helpwin, self.alignlines(help_lines[1:]), pairname="normal", align=False,
+            )
+            # blank the rest of the window without writing it line by line
+            helpwin.clrtobot()
         except curses.error:
             pass
         helpwin.refresh()
@@ -1046,8 +1381,9 @@ The following are valid keystrokes:
         lines = windowtext.split("\n")
         confirmwin = curses.newwin(len(lines), 0, 0, 0)
         try:
-            for line in lines:
-                self.printstring(confirmwin, line, pairname="selected")
+            self.printstring(
+                confirmwin, self.alignlines(lines), pairname="selected", align=False,
+            )
         except curses.error:
             pass
         try:
@@ -1078,7 +1414,7 @@ The following are valid keystrokes:
                 """,
             )
         else:
-            confirmtext = confirm_messages[self.opts['operation']]
+            confirmtext = _(confirm_messages[self.opts['operation']])
 
         response = self.confirmationwindow(confirmtext)
 
@@ -1091,11 +1427,15 @@ The following are valid keystrokes:
         Recenter the screen.
 
         Once we scrolled with PgUp/PgDown, we can be pointing outside the
-        display zone. We print the patch with towin=False to compute the
-        location of the selected item even though it is outside the displayed
-        zone, and then update the scroll.
+        display zone. We look up the location of the selected item with
+        getitemstartline(), which works even though it is outside the
+        displayed zone, and then update the scroll.
         """
-        self.printitem(towin=False)
+        item = self.currentselecteditem
+        startline = self.getitemstartline(item)
+        if startline is not None:
+            self.selecteditemstartline = startline
+            self.selecteditemendline = startline + self.getnumlinesdisplayed(item, recursechildren=False) - 1
         self.updatescroll()
 
     def toggleamend(self):
@@ -1123,67 +1463,54 @@ The following are valid keystrokes:
 
         self.confirmationwindow(msg)
 
+    def getpendingkey(self):
+        """Return the next key if it has already been pressed, or None."""
+        self.statuswin.nodelay(True)
+        try:
+            return self.statuswin.getkey()
+        except curses.error:
+            return None
+        finally:
+            self.statuswin.nodelay(False)
+
     def handlekeypressed(self, keypressed):
         """
         Perform actions based on pressed keys.
 
         Return true to exit the main loop.
         """
-        if keypressed in ["k", "KEY_UP"]:
-            self.uparrowevent()
-        elif keypressed in ["K", "KEY_PPAGE"]:
-            self.uparrowshiftevent()
-        elif keypressed in ["j", "KEY_DOWN"]:
-            self.downarrowevent()
-        elif keypressed in ["J", "KEY_NPAGE"]:
-            self.downarrowshiftevent()
-        elif keypressed in ["l", "KEY_RIGHT"]:
-            self.rightarrowevent()
-        elif keypressed in ["h", "KEY_LEFT"]:
-            self.leftarrowevent()
-        elif keypressed in ["H", "KEY_SLEFT"]:
-            self.leftarrowshiftevent()
-        elif keypressed in ["q"]:
+        handler = self.keyhandlers.get(keypressed)
+        if handler is not None:
+            handler()
+        elif keypressed == "q":
             raise util.Abort(_('user quit'))
-        elif keypressed in ['a']:
-            self.toggleamend()
-        elif keypressed in ["c"]:
+        elif keypressed == "c":
             self.opts['confirm'] |= self.opts['operation'] != 'crecord'
             if self.confirmcommit():
                 self.opts['operation'] = 'crecord'
                 return True
-        elif keypressed in ["s"]:
+        elif keypressed == "s":
             self.opts['confirm'] |= self.opts['operation'] != 'cstage'
             if self.confirmcommit():
                 self.opts['operation'] = 'cstage'
                 return True
-        elif keypressed in ["r"]:
+        elif keypressed == "r":
             if self.confirmcommit(review=True):
                 self.opts['commit'] = True
                 self.opts['crecord_reviewpatch'] = True
                 return True
-        elif keypressed in [' ']:
-            self.toggleapply()
-        elif keypressed in ['A']:
-            self.toggleall()
-        elif keypressed in ["f"]:
-            self.togglefolded()
-        elif keypressed in ["F"]:
+        elif keypressed == "F":
             self.togglefolded(foldparent=True)
-        elif keypressed in ["?"]:
+        elif keypressed == "?":
             self.helpwindow()
             self.stdscr.clear()
             self.stdscr.refresh()
-        elif len(keypressed) == 1 and curses.unctrl(keypressed) in [b"^L"]:
+        elif len(keypressed) == 1 and curses.unctrl(keypressed) == b"^L":
             # scroll the current line to the top of the screen, and redraw
             # everything
             self.scrolllines(self.selecteditemstartline)
             self.stdscr.clear()
             self.stdscr.refresh()
-        elif keypressed in ["g", "KEY_HOME"]:
-            self.handlefirstlineevent()
-        elif keypressed in ["G", "KEY_END"]:
-            self.handlelastlineevent()
         return False
 
     def main(self, stdscr, opts):
@@ -1209,6 +1536,9 @@ The following are valid keystrokes:
         # interface, it should be printed by the calling code
         self.initerr = None
         self.yscreensize, self.xscreensize = self.stdscr.getmaxyx()
+        # separator lines printed between headers and between hunks
+        self.headerseparator = "_" * self.xscreensize
+        self.hunkseparator = " " * self.xscreensize
 
         curses.start_color()
         try:
@@ -1235,6 +1565,10 @@ The following are valid keystrokes:
         self.getcolorpair(curses.COLOR_RED, None, name="deletion")
         self.getcolorpair(curses.COLOR_GREEN, None, name="addition")
         self.getcolorpair(curses.COLOR_WHITE, curses.COLOR_BLUE, name="legend")
+        for name in ("normal", "selected"):
+            self.boldcolorpairnames[name] = self.getcolorpair(
+                name=name, attrlist=[curses.A_BOLD],
+            )
         # newwin([height, width,] begin_y, begin_x)
         self.statuswin = curses.newwin(self.numstatuslines, 0, 0, 0)
         self.statuswin.keypad(True)  # interpret arrow-key, etc. ESC sequences
@@ -1270,5 +1604,9 @@ The following are valid keystrokes:
                     continue
             except curses.error:
                 keypressed = "FOOBAR"
-            if self.handlekeypressed(keypressed):
-                break
+            # handle the keys which have queued up in the meantime before
+            # redrawing, so that holding down a key doesn't make us lag
+            while keypressed is not None:
+                if self.handlekeypressed(keypressed):
+                    return
+                keypressed = self.errorstr is None and self.getpendingkey() or None
@@ -20,7 +20,7 @@ from typing import IO, cast
 
 from .chunk_selector import chunkselector
 from .crpatch import Header, filterpatch, parsepatch
-from .util import Abort, closefds, copyfile, system
+from .util import Abort, closefds, linkorcopyfile, movefile, system
 
 
 def dorecord(ui, repo, *pats, **opts):
@@ -100,7 +100,7 @@ def dorecord(ui, repo, *pats, **opts):
             contenders.add(os.fsdecode(tofile))
 
     changed = changes[0] | changes[1] | changes[2]
-    newfiles: list = [f for f in changed if f in contenders]
+    newfiles: list = list(changed & contenders)
 
     if not newfiles:
         ui.status(_('no changes to record'))
@@ -121,8 +121,9 @@ def dorecord(ui, repo, *pats, **opts):
         index_backup.backup_tree()
 
         # backup continues
+        backedup = modified | added
         for f in newfiles:
-            if f not in (modified | added):
+            if f not in backedup:
                 continue
             prefix = os.fsdecode(f).replace('/', '_') + '.'
             fd, tmpname = tempfile.mkstemp(
@@ -133,31 +134,32 @@ def dorecord(ui, repo, *pats, **opts):
             ui.debug(f'backup {f!r} as {tmpname!r}')
             pathname = repo.path / f
             if os.path.isfile(pathname):
-                copyfile(pathname, tmpname)
+                # the working copy is replaced rather than modified in place
+                # by git checkout and git apply, so a hard link is enough
+                linkorcopyfile(pathname, tmpname)
             if f in modified:
                 backups[f] = tmpname
             elif f in added:
                 newly_added_backups[f] = tmpname
 
-        fp = io.BytesIO()
-        all_backups = {}
-        all_backups.update(backups)
-        all_backups.update(newly_added_backups)
-        for c in chunks:
-            c.write(fp)
-        dopatch = fp.tell()
-        fp.seek(0)
+        dopatch = len(chunks)
+
+        # unless the patch needs to be reviewed or logged, it is written
+        # straight to git apply instead of being serialised in memory first
+        patchtext = None
+        if opts['crecord_reviewpatch'] or ui.debuglevel >= 2:
+            fp = io.BytesIO()
+            for c in chunks:
+                c.write(fp)
+            patchtext = fp.getvalue()
+            del fp
 
         # 2.5 optionally review / modify patch in text editor
         if opts['crecord_reviewpatch']:
-            patchtext = fp.read()
-            reviewedpatch = ui.edit(patchtext, "")
-            fp.truncate(0)
-            fp.write(reviewedpatch)
-            fp.seek(0)
+            patchtext = ui.edit(patchtext, "")
 
         # 3a. apply filtered patch to clean repo  (clean)
-        if backups or any(f in contenders for f in removed):
+        if backups or not contenders.isdisjoint(removed):
             system(
                 ["git", "checkout", "-f"]
                 + git_base
@@ -175,13 +177,18 @@ def dorecord(ui, repo, *pats, **opts):
         if dopatch:
             try:
                 ui.debug('applying patch')
-                ui.debug(fp.getvalue().decode("UTF-8", "hexreplace"))
+                if patchtext is not None:
+                    ui.debug(patchtext.decode("UTF-8", "hexreplace"))
                 p = subprocess.Popen(
                     ["git", "apply", "--whitespace=nowarn"],
                     stdin=subprocess.PIPE,
                     close_fds=closefds,
                 )
-                p.stdin.write(fp.getvalue())
+                if patchtext is not None:
+                    p.stdin.write(patchtext)
+                else:
+                    for c in chunks:
+                        c.write(p.stdin)
                 p.stdin.close()
                 p.wait()
             except Exception as err:  # noqa: B902
@@ -190,7 +197,7 @@ def dorecord(ui, repo, *pats, **opts):
                     raise Abort(s)
                 else:
                     raise Abort(_('patch failed to apply'))
-        del fp
+        del patchtext
 
         # 4. We prepared working directory according to filtered patch.
         #    Now is the time to delegate the job to commit/qrefresh or the like!
@@ -211,14 +218,14 @@ def dorecord(ui, repo, *pats, **opts):
         try:
             for realname, tmpname in backups.items():
                 ui.debug(f'restoring {tmpname!r} to {realname!r}')
-                copyfile(tmpname, os.path.join(repo.path, realname))
-                os.unlink(tmpname)
+                movefile(tmpname, os.path.join(repo.path, realname))
             for realname, tmpname in newly_added_backups.items():
                 ui.debug(f'restoring {tmpname!r} to {realname!r}')
-                copyfile(tmpname, os.path.join(repo.path, realname))
-                os.unlink(tmpname)
-            os.rmdir(backupdir)
+                movefile(tmpname, os.path.join(repo.path, realname))
             if index_backup:
                 index_backup.write()
+            # other sessions' or leftover backups may still be there, so
+            # only remove the directory if it's empty
+            os.rmdir(backupdir)
         except (OSError, NameError):
             pass
@@ -600,12 +600,15 @@ class Hunk(PatchNode):
 
     def countchanges(self) -> tuple[int, int]:
         """changedlines -> (n+,n-)"""
-        add = len(
-            [line for line in self.changedlines if line.applied and line.diffop == HunkLine.INSERT],
-        )
-        rem = len(
-            [line for line in self.changedlines if line.applied and line.diffop == HunkLine.DELETE],
-        )
+        add = rem = 0
+        for line in self.changedlines:
+            if not line.applied:
+                continue
+            diffop = line.diffop
+            if diffop == HunkLine.INSERT:
+                add += 1
+            elif diffop == HunkLine.DELETE:
+                rem += 1
         return add, rem
 
     def countoffsets(self):
@@ -943,8 +946,9 @@ def parsepatch(fp: IO[bytes]) -> PatchRoot:
             )
             self.header.hunks.append(h)
             self.headers.append(h)
-            self.fromline += len(self.before) + h.removed + len(self.context)
-            self.toline += len(self.before) + h.added + len(self.context)
+            contextlen = len(self.before) + len(self.context)
+            self.fromline += contextlen + h.removed
+            self.toline += contextlen + h.added
             self.before = []
             self.hunk = []
             self.context = []
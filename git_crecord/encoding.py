@@ -10,6 +10,7 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import unicodedata
+from functools import lru_cache
 
 # How to treat ambiguous-width characters. Set to 'WFA' to treat as wide.
 wide = "WF"
@@ -17,7 +18,38 @@ wide = "WF"
 
 def ucolwidth(d: str) -> int:
     """Find the column width of a Unicode string for display"""
+    if d.isascii():
+        # every ASCII character takes up exactly one column
+        return len(d)
+    return _widecolwidth(d)
+
+
+# wide strings (e.g. CJK file names and lines) tend to be measured repeatedly
+@lru_cache(maxsize=4096)
+def _widecolwidth(d: str) -> int:
     eaw = getattr(unicodedata, 'east_asian_width', None)
     if eaw is not None:
         return sum(eaw(c) in wide and 2 or 1 for c in d)
     return len(d)
+
+
+def ucolend(d: str, start: int, width: int) -> int:
+    """Find the column after a Unicode string displayed from column start
+
+    The string wraps onto as many lines of the given width as it needs, and
+    all of their columns are counted.  A double width character which doesn't
+    fit at the end of a line is moved to the next one, like curses does.
+    """
+    colwidth = ucolwidth(d)
+    if colwidth == len(d):
+        # no double width characters
+        return start + colwidth
+    end = start
+    for c in d:
+        if unicodedata.east_asian_width(c) in wide:
+            if end % width == width - 1:
+                end += 1
+            end += 2
+        else:
+            end += 1
+    return end
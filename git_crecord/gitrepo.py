@@ -59,36 +59,34 @@ class GitIndex:
 class GitRepo:
     def __init__(self, path: os.PathLike | str | None):
         try:
-            self.path = Path(
-                util.systemcall(
-                    ['git', 'rev-parse', '--show-toplevel'],
-                    dir=path,
-                    encoding="fs",
-                    onerr=util.Abort,
-                ).rstrip('\n'),
-            )
+            toplevel, controldir = util.systemcall(
+                ['git', 'rev-parse', '--show-toplevel', '--git-dir'],
+                dir=path,
+                encoding="fs",
+                onerr=util.Abort,
+            ).rstrip('\n').split('\n', 1)
+            self.path = Path(toplevel)
+            # the control directory may be given relative to path; it
+            # can't move while we run, so resolve it only once
             self._controldir = Path(
-                util.systemcall(
-                    ['git', 'rev-parse', '--git-dir'],
-                    dir=path,
-                    encoding="fs",
-                ).rstrip('\n'),
-            )
+                path if path is not None else ".", controldir,
+            ).resolve()
             if not self._controldir.is_dir():
                 raise util.Abort
         except util.Abort:
             sys.exit(1)
+        self._index_path = self._controldir / INDEX_FILENAME
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.path})"
 
     @property
     def controldir(self) -> Path:
-        return self._controldir.resolve()
+        return self._controldir
 
     @property
     def index_path(self) -> Path:
-        return self.controldir / INDEX_FILENAME
+        return self._index_path
 
     def open_index(self) -> GitIndex:
         return GitIndex(self.index_path)
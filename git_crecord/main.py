@@ -8,34 +8,92 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import argparse
-import importlib.metadata
 import os
 import sys
 import tempfile
+from contextlib import contextmanager
+from functools import cached_property
 from gettext import gettext as _
 from pathlib import Path
 from typing import Optional
 
-from . import crecord_core
 from .gitrepo import GitRepo
 from .util import Abort, system, systemcall
 
 
 class Config:
+    __slots__ = ('_cache',)
+
+    def __init__(self):
+        # the whole configuration, read on first use
+        self._cache: Optional[dict[bytes, bytes]] = None
+
+    def _load(self) -> dict[bytes, bytes]:
+        """Read all configuration variables with a single git call
+
+        The values are kept undecoded, so that only the ones which are looked
+        up need to be valid UTF-8.
+        """
+        out = systemcall(
+            ['git', 'config', '--list', '-z'],
+            onerr=Abort,
+            errprefix=_("failed to read the configuration"),
+        )
+        config = {}
+        # each entry is the key and the value separated by a newline, or just
+        # the key if it has no value; the later ones override the earlier ones
+        # just like git config --get
+        for entry in out.split(b'\0'):
+            if entry:
+                key, sep, value = entry.partition(b'\n')
+                config[key] = value
+        return config
+
     def get(self, section, item, default=None) -> Optional[str]:
-        try:
-            return systemcall(
-                ['git', 'config', '--get', f'{section}.{item}'],
-                onerr=KeyError,
-                encoding="UTF-8",
-            ).rstrip('\n')
-        except KeyError:
+        if self._cache is None:
+            self._cache = self._load()
+        # git config --list prints the section and variable names in lower
+        # case, only subsection names keep their case
+        name, dot, subsection = section.partition('.')
+        key = f'{name.lower()}{dot}{subsection}.{item.lower()}'
+        value = self._cache.get(key.encode("UTF-8"))
+        if value is None:
             return default
+        return value.decode("UTF-8")
 
     def set(self, section, item, value, source=""):
         raise NotImplementedError
 
 
+def joinmessage(*msg, sep=' ', end='\n') -> str:
+    """Join the parts of a message the way print() would"""
+    return sep.join(str(m) for m in msg) + end
+
+
+# characters which make git run the editor through the shell
+shell_metacharacters = "|&;<>()$`\\\"'*?[#~=%"
+
+# paths taking up more bytes than this are passed to git in a file rather
+# than on the command line, well below the usual limits on its length
+pathspec_argv_limit = 100000
+
+# options passed through to git commit
+commit_options = (
+    "author",
+    "date",
+    "amend",
+    "signoff",
+    "cleanup",
+    "reset_author",
+    "gpg_sign",
+    "no_gpg_sign",
+    "reedit_message",
+    "reuse_message",
+    "fixup",
+    "quiet",
+)
+
+
 class Ui:
     def __init__(self, repo: GitRepo):
         self.repo = repo
@@ -43,11 +101,11 @@ class Ui:
         self.debuglevel = 0
 
     def print_message(self, *msg, debuglevel: int, **opts):
-        if self.debuglevel < debuglevel:
+        if not msg or self.debuglevel < debuglevel:
             return
 
         sys.stdout.flush()
-        print(*msg, **opts, file=sys.stderr)
+        sys.stderr.write(joinmessage(*msg, **opts))
         sys.stderr.flush()
 
     def debug(self, *msg, **opts):
@@ -60,12 +118,12 @@ class Ui:
         self.print_message(*msg, debuglevel=0, **opts)
 
     def status(self, *msg, **opts):
-        print(*msg, **opts)
+        sys.stdout.write(joinmessage(*msg, **opts))
 
     def setdebuglevel(self, level):
         self.debuglevel = level
 
-    @property
+    @cached_property
     def editor(self) -> str:
         return (
             os.environ.get("GIT_EDITOR")
@@ -87,10 +145,15 @@ class Ui:
             f.close()
 
             editor = self.editor
+            if any(c in shell_metacharacters for c in editor):
+                # let the shell interpret the command, passing the file
+                # name as an argument instead of quoting it, like git does
+                cmd = ['sh', '-c', f'{editor} "$@"', editor, f.name]
+            else:
+                # no need to spawn a shell just to split the words
+                cmd = editor.split() + [f.name]
 
-            system(
-                f'{editor} "{f.name}"', onerr=Abort, errprefix=_("edit failed"),
-            )
+            system(cmd, onerr=Abort, errprefix=_("edit failed"))
 
             t = Path(f.name).read_bytes()
 
@@ -99,14 +162,36 @@ class Ui:
 
         return t
 
+    @contextmanager
+    def pathspec(self, files):
+        """
+        Yield the git arguments which pass the paths to a command.
+
+        Paths which would take up too much of the command line are written
+        into a temporary file in the control directory instead, which git
+        reads them from. This needs Git 2.26 or later.
+        """
+        paths = [os.fsencode(f) for f in files]
+        if sum(len(path) + 1 for path in paths) <= pathspec_argv_limit:
+            yield ['--'] + list(files)
+            return
+        fd, name = tempfile.mkstemp(prefix="CRECORD_PATHSPEC.", dir=self.repo.controldir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"\0".join(paths))
+            yield [f"--pathspec-from-file={name}", "--pathspec-file-nul"]
+        finally:
+            os.unlink(name)
+
     def stage(self, *files, **opts):
         to_add = [f for f in files if os.path.exists(f)]
         if to_add:
-            system(
-                ['git', 'add', '-f', '--'] + to_add,
-                onerr=Abort,
-                errprefix=_("add failed"),
-            )
+            with self.pathspec(to_add) as pathspec:
+                system(
+                    ['git', 'add', '-f'] + pathspec,
+                    onerr=Abort,
+                    errprefix=_("add failed"),
+                )
 
     def commit(self, *files, **opts):
         msgfile = self.repo.controldir / "CRECORD_COMMITMSG"
@@ -119,45 +204,30 @@ class Ui:
             if opts["cleanup"] is None:
                 opts["cleanup"] = "strip"
 
-            for k, v in opts.items():
-                if k in (
-                    "author",
-                    "date",
-                    "amend",
-                    "signoff",
-                    "cleanup",
-                    "reset_author",
-                    "gpg_sign",
-                    "no_gpg_sign",
-                    "reedit_message",
-                    "reuse_message",
-                    "fixup",
-                    "quiet",
-                ):
-                    if v is None:
-                        continue
-                    if isinstance(v, bool):
-                        if v is True:
-                            args.append("--%s" % k.replace("_", "-"))
-                    else:
-                        args.append("--{}={}".format(k.replace("_", "-"), v))
+            for k in commit_options:
+                v = opts.get(k)
+                if v is None or v is False:
+                    continue
+                option = k.replace("_", "-")
+                if v is True:
+                    args.append(f"--{option}")
+                else:
+                    args.append(f"--{option}={v}")
 
             to_add = [f for f in files if os.path.exists(f)]
             if to_add:
+                with self.pathspec(to_add) as pathspec:
+                    system(
+                        ['git', 'add', '-f', '-N'] + pathspec,
+                        onerr=Abort,
+                        errprefix=_("add failed"),
+                    )
+            commit = ['git', 'commit']
+            if opts["message"]:
+                commit += ['-F', os.fspath(msgfile)]
+            with self.pathspec(files) as pathspec:
                 system(
-                    ['git', 'add', '-f', '-N', '--'] + to_add,
-                    onerr=Abort,
-                    errprefix=_("add failed"),
-                )
-            if not opts["message"]:
-                system(
-                    ['git', 'commit'] + args + ['--'] + list(files),
-                    onerr=Abort,
-                    errprefix=_("commit failed"),
-                )
-            else:
-                system(
-                    ['git', 'commit', '-F', msgfile.name] + args + ['--'] + list(files),
+                    commit + args + pathspec,
                     onerr=Abort,
                     errprefix=_("commit failed"),
                 )
@@ -178,19 +248,22 @@ class Ui:
             msgfile.unlink(missing_ok=True)
 
 
-def main():
-    prog = os.path.basename(sys.argv[0]).replace('-', ' ')
-    version = importlib.metadata.version("git-crecord")
+class VersionAction(argparse.Action):
+    """Print the version and exit, looking it up only when asked to"""
 
-    subcommand = prog.split(' ')[-1].replace('.py', '')
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, **kwargs):
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, **kwargs)
 
-    if subcommand == 'crecord':
-        action = 'commit or stage'
-    elif subcommand == 'cstage':
-        action = 'stage'
-    elif subcommand == 'cunstage':
-        action = 'keep staged'
+    def __call__(self, parser, namespace, values, option_string=None):
+        import importlib.metadata
 
+        version = importlib.metadata.version("git-crecord")
+        print(f'{parser.prog} {version}')
+        parser.exit()
+
+
+def build_parser(prog: str, action: str) -> argparse.ArgumentParser:
+    """Build the command line parser for the given program name and action"""
     parser = argparse.ArgumentParser(description='interactively select changes to %s' % action, prog=prog)
     parser.add_argument('--author', default=None, help='override author for commit')
     parser.add_argument('--date', default=None, help='override date for commit')
@@ -226,10 +299,26 @@ def main():
         '--confirm', default=False, action='store_true',
         help='show confirmation prompt after selecting changes',
     )
-    parser.add_argument('--version', action='version', version=f'%(prog)s {version}')
+    parser.add_argument('--version', action=VersionAction, help="show program's version number and exit")
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--cached', '--staged', action='store_true', default=False, help=argparse.SUPPRESS)
     group.add_argument('--index', action='store_true', default=False, help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    prog = os.path.basename(sys.argv[0]).replace('-', ' ')
+
+    subcommand = prog.split(' ')[-1].replace('.py', '')
+
+    if subcommand == 'crecord':
+        action = 'commit or stage'
+    elif subcommand == 'cstage':
+        action = 'stage'
+    elif subcommand == 'cunstage':
+        action = 'keep staged'
+
+    parser = build_parser(prog, action)
     args = parser.parse_args()
 
     opts = vars(args)
@@ -244,6 +333,10 @@ def main():
     if subcommand == 'cunstage':
         opts['cached'] = True
 
+    # the record machinery pulls in curses and the patch parser, which
+    # aren't needed to print the help or to report a usage error
+    from . import crecord_core
+
     repo = GitRepo(".")
     ui = Ui(repo)
     ui.setdebuglevel(opts['verbose'])
@@ -133,6 +133,33 @@ def copyfile(src: str | Path, dest: str | Path, copystat=True):
             raise Abort(str(inst))
 
 
+def linkorcopyfile(src: str | Path, dest: str | Path):
+    """Hard link a file if possible, fall back to copying it otherwise"""
+    if not os.path.islink(src):
+        try:
+            if os.path.lexists(dest):
+                os.unlink(dest)
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    copyfile(src, dest)
+
+
+def movefile(src: str | Path, dest: str | Path):
+    """Move a file, copying it if it can't be renamed (e.g. across devices)"""
+    if os.path.lexists(dest) and os.path.samestat(os.lstat(src), os.lstat(dest)):
+        # rename() does nothing if both names are links to the same file,
+        # so the source has to be removed explicitly
+        os.unlink(src)
+        return
+    try:
+        os.replace(src, dest)
+    except OSError:
+        copyfile(src, dest)
+        os.unlink(src)
+
+
 def ellipsis(text, maxlength=400):
     """Trim string to at most maxlength (default: 400) columns in display."""
     return trim(text, maxlength, ellipsis='...')
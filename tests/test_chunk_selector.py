@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import curses
+import io
+import signal
+import unicodedata
+
+import pytest
+
+from git_crecord.chunk_selector import CursesChunkSelector
+from git_crecord.crpatch import parsepatch
+
+
+@pytest.fixture(autouse=True)
+def acs(monkeypatch):
+    # the line drawing characters are only defined once curses is initialised
+    monkeypatch.setattr(curses, "ACS_CKBOARD", ord("#"), raising=False)
+
+
+class FakeWindow:
+    """A curses pad stand-in which keeps the text and attributes written to it"""
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self.erase()
+
+    def erase(self):
+        self.cells = [[(" ", 0)] * self.cols for _ in range(self.rows)]
+        self.y = self.x = 0
+
+    def getyx(self):
+        return self.y, self.x
+
+    def getmaxyx(self):
+        return self.rows, self.cols
+
+    def move(self, y, x):
+        if not (0 <= y < self.rows and 0 <= x < self.cols):
+            raise curses.error("move() returned ERR")
+        self.y, self.x = y, x
+
+    def addstr(self, text, attr=0):
+        # like curses, expand tabs and show control characters as ^X
+        for c in text:
+            if c == "\t":
+                for i in range(8 - self.x % 8):
+                    self.addch(" ", attr)
+            elif ord(c) < 0x20:
+                self.addch("^", attr)
+                self.addch(chr(ord(c) + 64), attr)
+            else:
+                self.addch(c, attr)
+
+    def addch(self, c, attr=0):
+        if unicodedata.east_asian_width(c) in "WF":
+            # a double width character doesn't get split between two lines,
+            # and takes up an extra cell
+            if self.x + 1 == self.cols:
+                self.addch(" ", attr)
+            self.cells[self.y][self.x] = (c, attr)
+            self.advance()
+            self.cells[self.y][self.x] = ("", attr)
+        else:
+            self.cells[self.y][self.x] = (c, attr)
+        self.advance()
+
+    def advance(self):
+        if self.x + 1 < self.cols:
+            self.x += 1
+        elif self.y + 1 < self.rows:
+            self.y, self.x = self.y + 1, 0
+        else:
+            raise curses.error("addch() returned ERR")
+
+    def hline(self, c, n):
+        for x in range(self.x, min(self.x + n, self.cols)):
+            self.cells[self.y][x] = ("#", c)
+
+    def resize(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.erase()
+
+    def touchwin(self):
+        pass
+
+    def noutrefresh(self, *args):
+        pass
+
+    def lines(self):
+        return ["".join(c for c, attr in row).rstrip() for row in self.cells]
+
+
+def makepatch(nfiles=3, nhunks=3, nlines=2, longwords=0):
+    """Make a patch, with an added line of longwords words at the end of each hunk"""
+    diff = io.BytesIO()
+    for f in range(nfiles):
+        diff.write(
+            b"diff --git a/file%d b/file%d\n"
+            b"index 0000000..1111111 100644\n"
+            b"--- a/file%d\n"
+            b"+++ b/file%d\n" % (f, f, f, f),
+        )
+        for h in range(nhunks):
+            start = h * 20 + 1
+            diff.write(b"@@ -%d,%d +%d,%d @@\n" % (start, nlines + 2, start, nlines + 2 + bool(longwords)))
+            diff.write(b" before %d\n" % h)
+            for i in range(nlines):
+                diff.write(b"-old line %d with some more text to make it wrap on a narrow screen\n" % i)
+            for i in range(nlines):
+                diff.write(b"+new line %d   \n" % i)
+            if longwords:
+                diff.write(b"+" + b"long " * longwords + b"\n")
+            diff.write(b" after %d\n" % h)
+    diff.seek(0)
+    return parsepatch(diff)
+
+
+def makeselector(patch, rows=15, cols=40, unfolded=False):
+    """Set up the selector the way _main() does, but with fake windows"""
+    selector = CursesChunkSelector(patch.headers, None)
+    if unfolded:
+        # unfolding a header unfolds its hunks too
+        for header in selector.headerlist:
+            selector.togglefolded(header)
+    selector.opts = {'operation': 'crecord'}
+    selector.yscreensize, selector.xscreensize = rows, cols
+    selector.headerseparator = "_" * cols
+    selector.hunkseparator = " " * cols
+    selector.usecolor = False
+    selector.getcolorpair(None, None, name="normal")
+    selector.getcolorpair(curses.COLOR_WHITE, curses.COLOR_MAGENTA, name="selected")
+    selector.getcolorpair(curses.COLOR_RED, None, name="deletion")
+    selector.getcolorpair(curses.COLOR_GREEN, None, name="addition")
+    selector.getcolorpair(curses.COLOR_WHITE, curses.COLOR_BLUE, name="legend")
+    for name in ("normal", "selected"):
+        selector.boldcolorpairnames[name] = selector.getcolorpair(name=name, attrlist=[curses.A_BOLD])
+    selector.chunkpad = FakeWindow(1, cols)
+    selector.numpadlines = selector.getnumlinesdisplayed(ignorefolding=True) + 1
+    selector.chunkpad = FakeWindow(selector.numpadlines, cols)
+    selector.selecteditemendline = selector.getnumlinesdisplayed(
+        selector.currentselecteditem, recursechildren=False,
+    )
+    return selector
+
+
+def paint(selector):
+    """Paint the pad the way updatescreen() does"""
+    if not selector.repaintchangeditems():
+        selector.paintpad()
+
+
+def visiblelines(selector, end):
+    return selector.chunkpad.lines()[selector.firstlineofpadtoprint:end]
+
+
+@pytest.mark.parametrize(
+    ("rows", "cols", "longwords", "keys"),
+    [
+        pytest.param(15, 40, 0, "jjjjjjjjjjjjjjjjjjjjjjjjjjjjjjkkkkkkkkkkkkkkk", id="lines"),
+        pytest.param(15, 40, 0, "JJJJjjjjjjJJJKKKKjjjjkkk", id="siblings"),
+        pytest.param(15, 40, 0, "jjjj jj jjjj kkk fjjjfkk", id="toggles"),
+        pytest.param(10, 40, 30, "JjJJkjJjjkkJ", id="tall item"),
+    ],
+)
+def test_incremental_repaint(rows, cols, longwords, keys):
+    incremental = makeselector(makepatch(longwords=longwords), rows, cols, unfolded=True)
+    full = makeselector(makepatch(longwords=longwords), rows, cols, unfolded=True)
+    for selector in (incremental, full):
+        selector.paintpad()
+
+    for key in keys:
+        for selector in (incremental, full):
+            selector.handlekeypressed(key)
+        paint(incremental)
+        full.paintpad()
+
+        assert incremental.firstlineofpadtoprint == full.firstlineofpadtoprint
+        # painting from scratch stops a little below the screen
+        end = min(full.paintedextent, full.firstlineofpadtoprint + rows - full.numstatuslines)
+        assert visiblelines(incremental, end) == visiblelines(full, end)
+
+
+def test_resize_while_repainting(monkeypatch):
+    monkeypatch.setattr(curses, "endwin", lambda: None)
+    monkeypatch.setattr(curses, "doupdate", lambda: None)
+    monkeypatch.setattr(curses, "newpad", FakeWindow)
+    monkeypatch.setattr("git_crecord.chunk_selector.gethw", lambda: (15, 50))
+    selector = makeselector(makepatch(), unfolded=True)
+    selector.statuswin = FakeWindow(selector.numstatuslines, 40)
+    selector.updatescreen()
+
+    # the terminal is resized while the items are painted again
+    selector.handlekeypressed(" ")
+    items = list(selector.painteditems)
+    item = items[len(items) // 2]
+    y, startline, printer, state = selector.painteditems[item]
+
+    def resizingprinter(item, selected):
+        selector.sigwinchhandler(signal.SIGWINCH, None)
+        printer(item, selected)
+
+    selector.painteditems[item] = (y, startline, resizingprinter, state)
+    selector.updatescreen()
+    selector.updatescreen()
+
+    expected = makeselector(makepatch(), cols=50, unfolded=True)
+    expected.handlekeypressed(" ")
+    expected.paintpad()
+    assert selector.chunkpad.getmaxyx() == expected.chunkpad.getmaxyx()
+    assert selector.firstlineofpadtoprint == expected.firstlineofpadtoprint
+    assert selector.chunkpad.lines() == expected.chunkpad.lines()
+
+
+def makeunusualpatch():
+    """Make a patch with lines which aren't printed as they are"""
+    diff = io.BytesIO(
+        b"diff --git a/file b/file\n"
+        b"index 0000000..1111111 100644\n"
+        b"--- a/file\n"
+        b"+++ b/file\n"
+        b"@@ -1,4 +1,6 @@\n"
+        b" \tindented with a tab\n"
+        b"-caf\xc3\xa9 \x1b[1mbold\x1b[0m\n"
+        b"+trailing whitespace" + b" " * 50 + b"\n"
+        b"+\tx\ty\tz" + b"\t" * 20 + b"\n"
+        b"+" + b"\xc3\xa9" * 100 + b"\n"
+        b"+" + "\u6f22\u5b57".encode() * 30 + b"\n"
+        b" \n"
+        b"diff --git a/other b/other\n"
+        b"index 0000000..1111111 100644\n"
+        b"--- a/other\n"
+        b"+++ b/other\n"
+        b"@@ -1 +1 @@\n"
+        b"-old\n"
+        b"+new\n",
+    )
+    return parsepatch(diff)
+
+
+@pytest.mark.parametrize("cols", range(16, 100))
+@pytest.mark.parametrize("unfolded", [False, True], ids=["folded", "unfolded"])
+@pytest.mark.parametrize("patch", [makepatch, makeunusualpatch], ids=["patch", "unusual"])
+def test_line_counts(patch, unfolded, cols):
+    selector = makeselector(patch(), rows=10000, cols=cols, unfolded=unfolded)
+    selector.paintpad()
+
+    assert selector.getnumlinesdisplayed() == selector.chunkpad.getyx()[0]
+    items = [part for part, printer, partisstart in selector.getdisplaylist(selector.headerlist, False, True) if partisstart]
+    for item in items:
+        y, startline, printer, state = selector.painteditems[item]
+        assert startline == y
+        assert selector.getitemstartline(item) == y
+    # a changed line follows either the start of its hunk or the previous
+    # line, with nothing else printed in between
+    for item, nextitem in zip(items, items[1:]):
+        if nextitem in selector.changedlines:
+            lines = selector.getnumlinesdisplayed(item, recursechildren=False)
+            assert selector.painteditems[nextitem][0] - selector.painteditems[item][0] == lines
+
+
+@pytest.mark.parametrize("folds", [(), (0,), (0, 2), (0, 1, 2), (0, 1, 2, 4, 9)])
+def test_adjacent_items(folds):
+    selector = makeselector(makepatch(), unfolded=True)
+    # fold a few of the headers and hunks
+    allitems = [item for header in selector.headerlist for item in [header, *header.hunks]]
+    for i in folds:
+        selector.togglefolded(allitems[i])
+
+    item = selector.headerlist[0]
+    visited = []
+    while item is not None:
+        visited.append(item)
+        assert selector.getadjacentitem(item, 1) is item.nextitem()
+        assert selector.getadjacentitem(item, -1) is item.previtem()
+        item = selector.getadjacentitem(item, 1)
+    displayed = [part for part, printer, partisstart in selector.getdisplaylist(selector.headerlist, False, True) if partisstart]
+    assert visited == displayed
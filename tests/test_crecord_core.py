@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import subprocess
+
+import pytest
+
+from git_crecord import crecord_core
+from git_crecord.gitrepo import GitRepo
+from git_crecord.main import Ui
+from git_crecord.util import Abort
+
+
+def select_all(opts, headers, ui):
+    pass
+
+
+@pytest.fixture
+def gitrepo(repo):
+    """Commit a file to the test repository"""
+    (repo / "file.txt").write_text("one\ntwo\n")
+    subprocess.run(["git", "add", "file.txt"], check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "initial"], check=True)
+    return GitRepo(repo)
+
+
+def test_abort_before_checkout_restores_backups(gitrepo, monkeypatch):
+    monkeypatch.setattr(crecord_core, "chunkselector", select_all)
+    monkeypatch.setenv("GIT_EDITOR", "false")
+    (gitrepo.path / "file.txt").write_text("one\nthree\n")
+
+    with pytest.raises(Abort):
+        crecord_core.dorecord(
+            Ui(gitrepo), gitrepo,
+            cached=False, index=False, operation="crecord", crecord_reviewpatch=True,
+        )
+
+    assert (gitrepo.path / "file.txt").read_text() == "one\nthree\n"
+    assert (gitrepo.path / "file.txt").stat().st_nlink == 1
+    assert not (gitrepo.controldir / "record-backups").exists()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import subprocess
+
+import pytest
+
+from git_crecord import main
+from git_crecord.gitrepo import GitRepo
+from git_crecord.main import Config, Ui
+from git_crecord.util import Abort
+
+
+def write_config(repo, text: bytes):
+    with open(repo / ".git" / "config", "ab") as f:
+        f.write(text)
+
+
+def test_config_get(repo):
+    write_config(
+        repo,
+        b'[core]\n'
+        b'\teditor = vim -n\n'
+        b'[foo]\n'
+        b'\tbare\n'
+        b'\tempty =\n'
+        b'\tmultiline = "one\\ntwo"\n'
+        b'\tcamelCase = yes\n'
+        b'\trepeated = first\n'
+        b'\trepeated = second\n'
+        b'[Remote "Origin"]\n'
+        b'\tURL = https://example.com/\n',
+    )
+    config = Config()
+    assert config.get("core", "editor") == "vim -n"
+    assert config.get("foo", "bare") == ""
+    assert config.get("foo", "empty") == ""
+    assert config.get("foo", "multiline") == "one\ntwo"
+    assert config.get("foo", "camelCase") == "yes"
+    assert config.get("foo", "repeated") == "second"
+    assert config.get("remote.Origin", "url") == "https://example.com/"
+    assert config.get("remote.origin", "url") is None
+    assert config.get("foo", "missing") is None
+    assert config.get("foo", "missing", "default") == "default"
+
+
+def test_config_get_invalid_utf8(repo):
+    write_config(repo, b'[foo]\n\tgood = ok\n\tbad = \xff\n')
+    config = Config()
+    assert config.get("foo", "good") == "ok"
+    with pytest.raises(UnicodeDecodeError):
+        config.get("foo", "bad")
+
+
+def test_config_get_broken_config(repo):
+    write_config(repo, b'[foo\n')
+    with pytest.raises(Abort):
+        Config().get("core", "editor")
+
+
+def staged(repo):
+    return subprocess.run(
+        ["git", "diff", "--cached", "--name-only", "-z"], cwd=repo, check=True, capture_output=True,
+    ).stdout.split(b"\0")[:-1]
+
+
+@pytest.mark.parametrize("limit", [100000, 0], ids=["argv", "file"])
+def test_stage_pathspec(repo, monkeypatch, limit):
+    monkeypatch.setattr(main, "pathspec_argv_limit", limit)
+    files = [repo / "a file", repo / "-n", repo / "*"]
+    for f in files:
+        f.write_text("text\n")
+
+    Ui(GitRepo(repo)).stage(*files)
+
+    assert sorted(staged(repo)) == [b"*", b"-n", b"a file"]
+    assert not list((repo / ".git").glob("CRECORD_*"))
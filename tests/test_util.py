@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+
+from git_crecord.util import linkorcopyfile, movefile
+
+
+def test_linkorcopyfile_links(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(b"data\n")
+    dest = tmp_path / "dest"
+    dest.write_bytes(b"old\n")
+
+    linkorcopyfile(src, dest)
+
+    assert dest.read_bytes() == b"data\n"
+    assert os.path.samefile(src, dest)
+
+
+def test_linkorcopyfile_copies_symlinks(tmp_path):
+    (tmp_path / "target").write_bytes(b"data\n")
+    src = tmp_path / "src"
+    src.symlink_to("target")
+    dest = tmp_path / "dest"
+
+    linkorcopyfile(src, dest)
+
+    assert dest.is_symlink()
+    assert os.readlink(dest) == "target"
+
+
+def test_movefile(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(b"data\n")
+    dest = tmp_path / "dest"
+    dest.write_bytes(b"old\n")
+
+    movefile(src, dest)
+
+    assert not src.exists()
+    assert dest.read_bytes() == b"data\n"
+
+
+def test_movefile_same_file(tmp_path):
+    dest = tmp_path / "dest"
+    dest.write_bytes(b"data\n")
+    src = tmp_path / "src"
+    os.link(dest, src)
+
+    movefile(src, dest)
+
+    assert not src.exists()
+    assert dest.read_bytes() == b"data\n"
+    assert dest.stat().st_nlink == 1